@@ -1,38 +1,118 @@
+from startup import startup_report
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 from sqlalchemy.orm import selectinload
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
-from imagekitio import ImageKit
-from imagekitio.models.UploadFileRequestOptions import UploadFileRequestOptions
+import asyncio
+import logging
 import tempfile
 import shutil
 import os
 import uuid
 
-from db import Post, create_db_and_tables, get_async_session, User, Like, Comment
+from db import (
+    Post, create_db_and_tables, check_schema_version, get_async_session,
+    User, Like, Comment, engine,
+)
 from users import auth_backend, current_active_user, fastapi_users
 from schemas import UserCreate, UserRead, UserUpdate
+from ratelimit import like_limit, comment_limit, upload_limit, upload_slots
+from events import get_event_bus
+from cache import InvalidatingCache
+from likebuffer import LikeBuffer
+
 
+logger = logging.getLogger(__name__)
 
 load_dotenv()
+startup_report.mark("imports")
+
+# ImageKit setup, deferred to the first upload
+@lru_cache
+def get_imagekit():
+    from imagekitio import ImageKit
+
+    return ImageKit(
+        public_key=os.getenv("IMAGEKIT_PUBLIC_KEY"),
+        private_key=os.getenv("IMAGEKIT_PRIVATE_KEY"),
+        url_endpoint=os.getenv("IMAGEKIT_URL"),
+    )
 
-# ImageKit setup
-imagekit = ImageKit(
-    public_key=os.getenv("IMAGEKIT_PUBLIC_KEY"),
-    private_key=os.getenv("IMAGEKIT_PRIVATE_KEY"),
-    url_endpoint=os.getenv("IMAGEKIT_URL"),
+# Blocking SDK call, run in a worker thread
+def upload_to_imagekit(path, file_name, options):
+    with open(path, "rb") as f:
+        return get_imagekit().upload_file(
+            file=f,
+            file_name=file_name,
+            options=options,
+        )
+
+# Cross-worker invalidation bus and the caches subscribed to it. The feed
+# cache is only safe across workers with a cross-process bus, otherwise it
+# needs FEED_CACHE=1 (e.g. single worker)
+event_bus = get_event_bus()
+feed_cache = InvalidatingCache(
+    event_bus,
+    enabled=event_bus.cross_process or os.getenv("FEED_CACHE") == "1",
 )
 
+# Optional write-coalescing for likes (LIKE_BUFFER=1)
+like_buffer = LikeBuffer(event_bus) if os.getenv("LIKE_BUFFER") == "1" else None
+
 # Lifespan (DB init)
+# DB_STARTUP=create runs create_all, DB_STARTUP=check only verifies the
+# stored schema version so workers don't wait on DDL locks
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    with startup_report.phase("schema"):
+        if os.getenv("DB_STARTUP", "create") == "check":
+            await check_schema_version()
+        else:
+            await create_db_and_tables()
+
+    with startup_report.phase("event_bus"):
+        await event_bus.start()
+        if like_buffer:
+            await like_buffer.start()
+
+    startup_report.set_ready()
+    logger.info("%s", startup_report)
     yield
+    startup_report.ready = False
+    if like_buffer:
+        await like_buffer.stop()
+    await event_bus.stop()
 
 app = FastAPI(lifespan=lifespan)
 
+# Health checks
+@app.get("/health/live", tags=["health"])
+async def liveness():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", tags=["health"])
+async def readiness():
+    if not startup_report.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+
+    return {"status": "ready"}
+
+
+@app.get("/health/startup", tags=["health"])
+async def startup_timings():
+    return startup_report.as_dict()
+
 # Auth routers
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
@@ -61,7 +141,12 @@ app.include_router(
 )
 
 
-@app.post("/upload", tags=["posts"])
+@app.post(
+    "/upload",
+    tags=["posts"],
+    # check the slot first so a rejected request keeps its rate budget
+    dependencies=[Depends(upload_slots), Depends(upload_limit)],
+)
 async def upload_file(
     file: UploadFile = File(...),
     caption: str = Form(""),
@@ -79,21 +164,20 @@ async def upload_file(
 
         # save temp file
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            shutil.copyfileobj(file.file, tmp)
+            await asyncio.to_thread(shutil.copyfileobj, file.file, tmp)
             temp_path = tmp.name
 
+        from imagekitio.models.UploadFileRequestOptions import UploadFileRequestOptions
+
         options = UploadFileRequestOptions(
             folder="/fastapi_uploads",
             use_unique_file_name=True,
         )
 
         # Upload to ImageKit
-        with open(temp_path, "rb") as f:
-            uploaded = imagekit.upload_file(
-                file=f,
-                file_name=file.filename,
-                options=options,
-            )
+        uploaded = await asyncio.to_thread(
+            upload_to_imagekit, temp_path, file.filename, options
+        )
 
         post = Post(
             caption=caption,
@@ -104,7 +188,7 @@ async def upload_file(
         )
 
         session.add(post)
-        await session.commit()
+        await event_bus.commit(session, ("posts", None))
         await session.refresh(post)
 
         return {
@@ -144,29 +228,50 @@ async def get_home(
 
     for post in posts:
         # like count
-        like_count = await session.scalar(
-            select(func.count(Like.id))
-            .where(Like.post_id == post.id)
-        )
+        like_count = feed_cache.get("likes", post.id)
+        if like_count is None:
+            generation = feed_cache.generation()
+            like_count = await session.scalar(
+                select(func.count(Like.id))
+                .where(Like.post_id == post.id)
+            )
+            feed_cache.set("likes", post.id, like_count, generation)
 
         # USER LIKED OR NOT
-        user_liked = await session.scalar(
-            select(func.count(Like.id))
-            .where(
-                Like.post_id == post.id,
-                Like.user_id == user.id
+        user_liked = None
+        if like_buffer:
+            like_count += like_buffer.delta(post.id)
+            user_liked = like_buffer.liked(user.id, post.id)
+
+        if user_liked is None:
+            user_liked = await session.scalar(
+                select(func.count(Like.id))
+                .where(
+                    Like.post_id == post.id,
+                    Like.user_id == user.id
+                )
             )
-        )
 
         # comments
-        comments_result = await session.execute(
-            select(Comment)
-            .where(Comment.post_id == post.id)
-            .options(selectinload(Comment.user))
-            .order_by(Comment.created_at)
-        )
+        comments = feed_cache.get("comments", post.id)
+        if comments is None:
+            generation = feed_cache.generation()
+            comments_result = await session.execute(
+                select(Comment)
+                .where(Comment.post_id == post.id)
+                .options(selectinload(Comment.user))
+                .order_by(Comment.created_at)
+            )
 
-        comments = comments_result.scalars().all()
+            comments = [
+                {
+                    "username": c.user.username,
+                    "text": c.text,
+                    "created_at": c.created_at.isoformat(),
+                }
+                for c in comments_result.scalars().all()
+            ]
+            feed_cache.set("comments", post.id, comments, generation)
 
         posts_data.append(
             {
@@ -184,14 +289,7 @@ async def get_home(
                 "liked": user_liked > 0,
 
                 # comments system
-                "comments": [
-                    {
-                        "username": c.user.username,
-                        "text": c.text,
-                        "created_at": c.created_at.isoformat(),
-                    }
-                    for c in comments
-                ],
+                "comments": comments,
 
                 # owner_check
                 "is_owner": post.user_id == user.id,
@@ -201,7 +299,11 @@ async def get_home(
     return {"posts": posts_data}
 
 
-@app.post("/posts/{post_id}/like", tags=["likes"])
+@app.post(
+    "/posts/{post_id}/like",
+    tags=["likes"],
+    dependencies=[Depends(like_limit)],
+)
 async def like_post(
     post_id: str,
     session: AsyncSession = Depends(get_async_session),
@@ -209,6 +311,12 @@ async def like_post(
 ):
     post_uuid = uuid.UUID(post_id)
 
+    if like_buffer:
+        liked = await like_buffer.toggle(user.id, post_uuid, session)
+        if liked is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return {"liked": liked}
+
     result = await session.execute(
         select(Like).where(
             Like.post_id == post_uuid,
@@ -219,16 +327,20 @@ async def like_post(
 
     if existing_like:
         await session.delete(existing_like)
-        await session.commit()
+        await event_bus.commit(session, ("likes", post_uuid))
         return {"liked": False}
 
     new_like = Like(user_id=user.id, post_id=post_uuid)
     session.add(new_like)
-    await session.commit()
+    await event_bus.commit(session, ("likes", post_uuid))
     return {"liked": True}
 
 
-@app.post("/posts/{post_id}/comment", tags=["comments"])
+@app.post(
+    "/posts/{post_id}/comment",
+    tags=["comments"],
+    dependencies=[Depends(comment_limit)],
+)
 async def add_comment(
     post_id: str,
     text: str = Form(...),
@@ -242,7 +354,7 @@ async def add_comment(
     )
 
     session.add(comment)
-    await session.commit()
+    await event_bus.commit(session, ("comments", comment.post_id))
     return {"success": True}
 
 
@@ -270,7 +382,12 @@ async def delete_post(
             )
 
         await session.delete(post)
-        await session.commit()
+        await event_bus.commit(
+            session,
+            ("posts", None),
+            ("likes", post_uuid),
+            ("comments", post_uuid),
+        )
 
         return {"success": True, "message": "Post deleted successfully"}
 
@@ -278,3 +395,7 @@ async def delete_post(
         raise
     except Exception:
         raise HTTPException(status_code=500, detail="Delete failed")
+
+
+# everything since the imports: clients, routers and routes
+startup_report.mark("app_setup")
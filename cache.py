@@ -0,0 +1,86 @@
+import time
+from typing import Any, Optional
+
+from events import ALL_TOPICS, Event, EventBus
+
+
+class InvalidatingCache:
+    """Per-worker cache keyed by (topic, key). Entries are dropped when an
+    event for the same topic and key arrives on the bus, or for the whole
+    topic when the event has no key. The TTL bounds staleness if an
+    invalidation is ever lost.
+
+    Readers take a `generation()` before querying and pass it to `set()`,
+    so a value read before an invalidation is never cached after it.
+    A disabled cache never stores anything."""
+
+    # past this many tracked invalidations, forget them all and treat
+    # every in-progress read as stale
+    max_stamps = 10_000
+
+    def __init__(self, bus: EventBus, ttl: float = 30.0, enabled: bool = True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: dict[tuple[str, str], tuple[float, Any]] = {}
+
+        # invalidation counter and when each key/topic was last invalidated
+        self._counter = 0
+        self._stamps: dict[tuple[str, str], int] = {}
+        self._topic_stamps: dict[str, int] = {}
+        self._all_stamp = 0
+
+        bus.subscribe(self.invalidate)
+
+    def generation(self) -> int:
+        return self._counter
+
+    def get(self, topic: str, key) -> Optional[Any]:
+        entry = self._entries.get((topic, str(key)))
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[(topic, str(key))]
+            return None
+
+        return value
+
+    def set(self, topic: str, key, value: Any, generation: int):
+        if not self.enabled:
+            return
+
+        entry_key = (topic, str(key))
+        invalidated = max(
+            self._stamps.get(entry_key, 0),
+            self._topic_stamps.get(topic, 0),
+            self._all_stamp,
+        )
+        if invalidated > generation:
+            return
+
+        self._entries[entry_key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, event: Event):
+        self._counter += 1
+
+        if event.topic == ALL_TOPICS:
+            self._all_stamp = self._counter
+            self._entries.clear()
+            return
+
+        if event.key is None:
+            self._topic_stamps[event.topic] = self._counter
+            for entry_key in [k for k in self._entries if k[0] == event.topic]:
+                del self._entries[entry_key]
+            return
+
+        if len(self._stamps) >= self.max_stamps:
+            self._stamps.clear()
+            self._all_stamp = self._counter
+
+        self._stamps[(event.topic, event.key)] = self._counter
+        self._entries.pop((event.topic, event.key), None)
+
+    def clear(self):
+        self._entries.clear()
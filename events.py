@@ -0,0 +1,341 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import stat
+import tempfile
+import uuid
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Topic of the event dispatched when notifications may have been missed
+ALL_TOPICS = "*"
+
+
+@dataclass(frozen=True)
+class Event:
+    topic: str
+    key: Optional[str] = None
+
+
+def make_events(pairs: Iterable[tuple]) -> list[Event]:
+    return [Event(topic=topic, key=None if key is None else str(key)) for topic, key in pairs]
+
+
+class EventBus:
+    """In-process bus. Subscribers are called synchronously for every
+    event published by this worker. Subclasses also forward events to
+    other workers and dispatch the ones they receive.
+
+    Write paths use `commit()`, which commits the session and publishes
+    its events together; backends that can, send them inside the same
+    transaction so they are delivered only if the write lands."""
+
+    # whether events reach other worker processes
+    cross_process = False
+    # whether prepare() already sends events as part of the transaction
+    notifies_in_transaction = False
+
+    def __init__(self):
+        self._subscribers: list[Callable[[Event], None]] = []
+
+    def subscribe(self, callback: Callable[[Event], None]):
+        self._subscribers.append(callback)
+
+    async def publish(self, topic: str, key=None):
+        await self.publish_many([(topic, key)])
+
+    async def publish_many(self, pairs: Iterable[tuple]):
+        """Publish (topic, key) pairs outside of any write transaction."""
+        events = make_events(pairs)
+        self._dispatch_all(events)
+        await self._safe_send(events)
+
+    async def prepare(self, session, *pairs) -> list[Event]:
+        """Attach (topic, key) pairs to the session's open transaction.
+        Pass the result to `committed()` once the session has committed."""
+        events = make_events(pairs)
+        if self.notifies_in_transaction and events:
+            await self._send_in_transaction(session, events)
+        return events
+
+    async def committed(self, events: list[Event]):
+        # local caches first, before anything can yield
+        self._dispatch_all(events)
+        if not self.notifies_in_transaction:
+            await self._safe_send(events)
+
+    async def commit(self, session, *pairs):
+        events = await self.prepare(session, *pairs)
+        await session.commit()
+        await self.committed(events)
+
+    def _dispatch(self, event: Event):
+        for callback in self._subscribers:
+            callback(event)
+
+    def _dispatch_all(self, events: list[Event]):
+        for event in events:
+            self._dispatch(event)
+
+    async def _safe_send(self, events: list[Event]):
+        if not events:
+            return
+        try:
+            await self._send(events)
+        except Exception:
+            # the write already committed; caches fall back to their TTL
+            logger.exception("Failed to publish %s", events)
+
+    async def _send(self, events: list[Event]):
+        pass
+
+    async def _send_in_transaction(self, session, events: list[Event]):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class UnixSocketBus(EventBus):
+    """Broadcasts events between workers on the same host. Every worker
+    binds a datagram socket in a private shared directory and publishing
+    sends the events to every other socket found there.
+
+    Datagrams carry a per-sender sequence number. A receiver that sees a
+    gap (a datagram dropped because its queue was full) dispatches
+    ALL_TOPICS so subscribed caches start over."""
+
+    cross_process = True
+
+    # events per datagram, well under the datagram size limit
+    batch_size = 200
+    send_attempts = 5
+
+    def __init__(self, directory: Optional[str] = None):
+        super().__init__()
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), f"snapnest-bus-{os.getuid()}"
+        )
+        self.path = None
+        # also names our socket, kept short for the AF_UNIX path limit
+        self.source = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._seq = 0
+        self._last_seq: dict[str, int] = {}
+        self._sock = None
+
+    async def start(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        # anyone able to write here could inject events
+        st = os.lstat(self.directory)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise RuntimeError(
+                f"Event bus directory {self.directory} must be a directory "
+                "owned by this user with mode 0700"
+            )
+
+        self.path = os.path.join(self.directory, f"{self.source}.sock")
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+
+    async def stop(self):
+        if self._sock is None:
+            return
+
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                return
+            self._receive(json.loads(data))
+
+    def _receive(self, payload: dict):
+        source, seq = payload["source"], payload["seq"]
+
+        last = self._last_seq.get(source)
+        if last is not None and seq != last + 1:
+            logger.warning("Missed events from %s, invalidating everything", source)
+            self._dispatch(Event(topic=ALL_TOPICS))
+
+        # forget senders now and then; a restarted worker has a new source
+        if len(self._last_seq) > 1000:
+            self._last_seq.clear()
+        self._last_seq[source] = seq
+
+        for topic, key in payload["events"]:
+            self._dispatch(Event(topic=topic, key=key))
+
+    async def _send(self, events: list[Event]):
+        for i in range(0, len(events), self.batch_size):
+            self._seq += 1
+            data = json.dumps({
+                "source": self.source,
+                "seq": self._seq,
+                "events": [[e.topic, e.key] for e in events[i:i + self.batch_size]],
+            }).encode()
+
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if path == self.path or not name.endswith(".sock"):
+                    continue
+                await self._send_to(path, data)
+
+    async def _send_to(self, path: str, data: bytes):
+        for attempt in range(self.send_attempts):
+            try:
+                self._sock.sendto(data, path)
+                return
+            except (ConnectionRefusedError, FileNotFoundError):
+                # worker is gone, clean up its socket
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                return
+            except BlockingIOError:
+                # receiver's queue is full, give it a moment to drain
+                await asyncio.sleep(0.001 * 2 ** attempt)
+
+        # the receiver will see the sequence gap on our next datagram
+        logger.warning("Dropped events for %s, receiver is busy", path)
+
+
+class PostgresBus(EventBus):
+    """Broadcasts events to every worker connected to the same database
+    using LISTEN/NOTIFY. Events from write paths are sent with
+    pg_notify inside the writing transaction, which Postgres delivers
+    on commit; one dedicated connection listens and is re-established
+    if it drops."""
+
+    cross_process = True
+    notifies_in_transaction = True
+
+    def __init__(self, engine, channel: str = "snapnest_events"):
+        super().__init__()
+        self.engine = engine
+        self.dsn = engine.url.render_as_string(hide_password=False).replace("+asyncpg", "")
+        self.channel = channel
+        # tags our own notifications, which were already dispatched locally
+        self.source = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._conn = None
+        self._stopping = False
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._stopping = False
+        await self._connect()
+
+    async def stop(self):
+        self._stopping = True
+
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except asyncio.CancelledError:
+                pass
+            self._reconnect_task = None
+
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def _connect(self):
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        await conn.add_listener(self.channel, self._on_notify)
+        conn.add_termination_listener(self._on_terminated)
+        self._conn = conn
+
+    def _on_terminated(self, conn):
+        if self._stopping or self._reconnect_task is not None:
+            return
+
+        logger.warning("Event bus connection lost, reconnecting")
+        self._conn = None
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.5
+        while not self._stopping:
+            try:
+                await self._connect()
+                break
+            except Exception:
+                logger.warning("Event bus reconnect failed, retrying in %.1fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        self._reconnect_task = None
+        # anything published while we were away is lost
+        self._dispatch(Event(topic=ALL_TOPICS))
+
+    def _on_notify(self, conn, pid, channel, payload):
+        data = json.loads(payload)
+        if data.get("source") == self.source:
+            return
+        self._dispatch(Event(topic=data["topic"], key=data.get("key")))
+
+    def _notify_statement(self, events: list[Event]):
+        from sqlalchemy import Text, bindparam, text
+        from sqlalchemy.dialects.postgresql import ARRAY
+
+        # one statement for the whole batch
+        statement = text(
+            "SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload"
+        ).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+        params = {
+            "channel": self.channel,
+            "payloads": [
+                json.dumps({"source": self.source, "topic": e.topic, "key": e.key})
+                for e in events
+            ],
+        }
+        return statement, params
+
+    async def _send_in_transaction(self, session, events: list[Event]):
+        await session.execute(*self._notify_statement(events))
+
+    async def _send(self, events: list[Event]):
+        async with self.engine.begin() as conn:
+            await conn.execute(*self._notify_statement(events))
+
+
+def create_event_bus(backend: Optional[str] = None) -> EventBus:
+    """Pick a backend from EVENT_BUS: "memory" (default), "unix" or "postgres"."""
+    backend = backend or os.getenv("EVENT_BUS", "memory")
+
+    if backend == "memory":
+        return EventBus()
+    if backend == "unix":
+        return UnixSocketBus(os.getenv("EVENT_BUS_DIR"))
+    if backend == "postgres":
+        from db import engine
+
+        return PostgresBus(engine)
+
+    raise ValueError(f"Unknown event bus backend: {backend}")
+
+
+@lru_cache
+def get_event_bus() -> EventBus:
+    """The worker's bus, created on first use."""
+    return create_event_bus()
@@ -187,6 +187,9 @@ def upload_page():
         if res.status_code == 200:
             st.success("Post uploaded!")
             st.rerun()
+        elif res.status_code == 429:
+            wait = res.headers.get("Retry-After", "a few")
+            st.warning(f"Too many uploads. Try again in {wait} seconds.")
         else:
             st.error("Upload failed")
 
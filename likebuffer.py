@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Like, Post, async_session_maker
+from events import EventBus
+
+logger = logging.getLogger(__name__)
+
+Key = tuple[uuid.UUID, uuid.UUID]  # (user_id, post_id)
+
+# rows per statement, well under the driver's bind parameter limit
+CHUNK_SIZE = 1000
+
+
+class LikeBuffer:
+    """Coalesces like toggles in memory and writes them in batches.
+
+    Each (user, post) pair keeps the state it had in the database and the
+    state the user wants now, so toggling back and forth before a flush
+    costs no writes at all. Pending changes are flushed every `interval`
+    seconds or once `max_events` pairs are waiting. Buffered state is per
+    worker: other workers see it after the next flush."""
+
+    def __init__(self, bus: EventBus, interval: float = 0.25, max_events: int = 500):
+        self.bus = bus
+        self.interval = interval
+        self.max_events = max_events
+
+        # key -> (liked in database, liked now)
+        self._pending: dict[Key, tuple[bool, bool]] = {}
+        self._inflight: dict[Key, tuple[bool, bool]] = {}
+        # post_id -> like count change not yet committed
+        self._delta: dict[uuid.UUID, int] = {}
+
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # let the loop finish its current flush instead of cancelling it
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    def liked(self, user_id: uuid.UUID, post_id: uuid.UUID) -> Optional[bool]:
+        """Buffered like state, or None if the database is up to date."""
+        entry = self._pending.get((user_id, post_id)) or self._inflight.get((user_id, post_id))
+        return None if entry is None else entry[1]
+
+    def delta(self, post_id: uuid.UUID) -> int:
+        return self._delta.get(post_id, 0)
+
+    async def toggle(self, user_id: uuid.UUID, post_id: uuid.UUID, session: AsyncSession) -> Optional[bool]:
+        """Toggle the like and return the new state, or None if the post
+        does not exist."""
+        key = (user_id, post_id)
+
+        current = self.liked(user_id, post_id)
+        if current is None:
+            result = await session.execute(
+                select(Post.id, Like.id)
+                .outerjoin(Like, and_(Like.post_id == Post.id, Like.user_id == user_id))
+                .where(Post.id == post_id)
+            )
+            row = result.first()
+            if row is None:
+                return None
+            stored = row[1] is not None
+
+            # another click may have been buffered while we were waiting
+            current = self.liked(user_id, post_id)
+            if current is None:
+                current = stored
+
+        stored = self._pending[key][0] if key in self._pending else current
+        liked = not current
+
+        if liked == stored:
+            # toggled back to what is already stored
+            self._pending.pop(key, None)
+        else:
+            self._pending[key] = (stored, liked)
+
+        self._add_delta(post_id, 1 if liked else -1)
+
+        if len(self._pending) >= self.max_events:
+            self._wake.set()
+
+        return liked
+
+    async def flush(self):
+        async with self._flush_lock:
+            # a previous flush that never finished
+            self._requeue()
+            if not self._pending:
+                return
+
+            self._inflight, self._pending = self._pending, {}
+            post_ids = {post_id for _, post_id in self._inflight}
+
+            committed = False
+            try:
+                async with async_session_maker() as session:
+                    await self._write(session)
+                    # one batch of events, sent with the transaction where
+                    # the bus supports it
+                    events = await self.bus.prepare(session, *[("likes", p) for p in post_ids])
+                    await session.commit()
+                    committed = True
+
+                    # nothing may yield between the commit and invalidating
+                    # local caches, or readers would count these likes twice
+                    self._settle()
+                    await self.bus.committed(events)
+            except Exception:
+                if committed:
+                    logger.exception("Like flush committed, but publishing it failed")
+                    return
+                logger.exception("Like flush failed, retrying on next flush")
+                self._requeue()
+
+    async def _write(self, session: AsyncSession):
+        # likes on posts deleted since they were buffered can never be
+        # written, drop them instead of failing the whole batch
+        post_ids = list({post_id for _, post_id in self._inflight})
+        existing = set()
+        for i in range(0, len(post_ids), CHUNK_SIZE):
+            result = await session.execute(
+                select(Post.id).where(Post.id.in_(post_ids[i:i + CHUNK_SIZE]))
+            )
+            existing.update(result.scalars())
+
+        to_insert = [
+            {"id": uuid.uuid4(), "user_id": u, "post_id": p, "created_at": datetime.utcnow()}
+            for (u, p), (_, liked) in self._inflight.items()
+            if liked and p in existing
+        ]
+        to_delete = [k for k, (_, liked) in self._inflight.items() if not liked]
+
+        for i in range(0, len(to_insert), CHUNK_SIZE):
+            await session.execute(
+                insert(Like)
+                .values(to_insert[i:i + CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+            )
+
+        for i in range(0, len(to_delete), CHUNK_SIZE):
+            await session.execute(
+                delete(Like).where(
+                    tuple_(Like.user_id, Like.post_id).in_(to_delete[i:i + CHUNK_SIZE])
+                )
+            )
+
+    def _settle(self):
+        # the in-flight batch is now stored, stop counting it on top
+        for (_, post_id), (_, liked) in self._inflight.items():
+            self._add_delta(post_id, -1 if liked else 1)
+        self._inflight = {}
+
+    def _requeue(self):
+        # put the in-flight batch back, rebasing newer toggles on the
+        # state that is actually stored
+        for key, (stored, liked) in self._inflight.items():
+            if key in self._pending:
+                liked = self._pending[key][1]
+            if liked == stored:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = (stored, liked)
+        self._inflight = {}
+
+    def _add_delta(self, post_id: uuid.UUID, change: int):
+        self._delta[post_id] = self._delta.get(post_id, 0) + change
+        if self._delta[post_id] == 0:
+            del self._delta[post_id]
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Like flusher error")
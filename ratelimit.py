@@ -0,0 +1,152 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Protocol
+
+from fastapi import Depends, HTTPException
+
+from db import User
+from users import current_active_user
+
+
+# Token bucket state for one (route, user) key
+@dataclass
+class Bucket:
+    tokens: float
+    updated_at: float
+
+
+class BucketStore(Protocol):
+    """Storage for token buckets. Swap in a shared backend (e.g. Redis)
+    to enforce limits across workers."""
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Try to take one token. Return 0 on success, otherwise the
+        number of seconds until a token becomes available."""
+        ...
+
+
+class InMemoryBucketStore:
+    """Per-process bucket store. Buckets that have been idle long enough
+    to refill completely are evicted, so memory stays bounded by the
+    number of recently active clients.
+
+    `max_buckets` is a hard cap. At the cap, idle buckets are swept early;
+    only if that doesn't free a tenth of the store are the least recently
+    used buckets dropped, and those may still be partly drained, so their
+    owners get a fresh burst. Size the cap well above active users times
+    limited routes (each bucket is a few hundred bytes) so that fallback
+    only kicks in under abuse."""
+
+    def __init__(self, max_buckets: int = 100_000, sweep_interval: float = 60.0):
+        self.max_buckets = max_buckets
+        self.sweep_interval = sweep_interval
+        # least recently used first
+        self._buckets: OrderedDict[str, Bucket] = OrderedDict()
+        self._idle_after: dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        async with self._lock:
+            now = time.monotonic()
+            self._maybe_evict(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = Bucket(tokens=burst, updated_at=now)
+                self._buckets[key] = bucket
+                self._idle_after[key] = burst / rate
+            else:
+                self._buckets.move_to_end(key)
+
+            # refill
+            elapsed = now - bucket.updated_at
+            bucket.tokens = min(burst, bucket.tokens + elapsed * rate)
+            bucket.updated_at = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0.0
+
+            return (1 - bucket.tokens) / rate
+
+    def _maybe_evict(self, now: float):
+        at_cap = len(self._buckets) >= self.max_buckets
+        if at_cap or now - self._last_sweep >= self.sweep_interval:
+            self._sweep_idle(now)
+
+        # still at the cap: drop least recently used buckets down to 90%
+        if at_cap:
+            while len(self._buckets) > self.max_buckets * 9 // 10:
+                key, _ = self._buckets.popitem(last=False)
+                del self._idle_after[key]
+
+    def _sweep_idle(self, now: float):
+        self._last_sweep = now
+        # a bucket idle for longer than its refill time is back to full,
+        # so dropping it is indistinguishable from keeping it
+        for key, bucket in list(self._buckets.items()):
+            if now - bucket.updated_at >= self._idle_after[key]:
+                del self._buckets[key]
+                del self._idle_after[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+bucket_store: BucketStore = InMemoryBucketStore()
+
+
+def set_bucket_store(store: BucketStore):
+    global bucket_store
+    bucket_store = store
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(route: str, rate: float, burst: int):
+    """Dependency limiting each user to `rate` requests per second on
+    `route`, with bursts of up to `burst` requests."""
+
+    async def dependency(user: User = Depends(current_active_user)):
+        retry_after = await bucket_store.take(f"{route}:{user.id}", rate, burst)
+        if retry_after > 0:
+            raise too_many_requests(retry_after)
+
+    return dependency
+
+
+class ConcurrencyLimiter:
+    """Global cap on in-flight requests. Requests beyond the cap are
+    rejected straight away instead of queueing on the connection pool."""
+
+    def __init__(self, limit: int, retry_after: float = 1.0):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.active = 0
+
+    async def __call__(self):
+        if self.active >= self.limit:
+            raise too_many_requests(self.retry_after)
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+
+# Limits for write endpoints
+like_limit = rate_limit("like", rate=2, burst=10)
+comment_limit = rate_limit("comment", rate=0.5, burst=5)
+upload_limit = rate_limit("upload", rate=0.1, burst=3)
+upload_slots = ConcurrencyLimiter(limit=8)
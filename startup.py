@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """Records how long each startup phase took, from the moment this
+    module is imported until the app reports ready."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._last = self.started_at
+        self.phases: dict[str, float] = {}
+        self.ready = False
+        self.total = 0.0
+
+    def mark(self, name: str):
+        """Close a phase that ran since the previous mark."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases[name] = self._last - started
+
+    def set_ready(self):
+        self.ready = True
+        self.total = time.perf_counter() - self.started_at
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "phases_ms": {k: round(v * 1000, 1) for k, v in self.phases.items()},
+            "total_ms": round(self.total * 1000, 1),
+        }
+
+    def __str__(self):
+        phases = ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in self.phases.items())
+        return f"Startup took {self.total * 1000:.1f}ms ({phases})"
+
+
+startup_report = StartupReport()
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import InvalidatingCache
+from events import ALL_TOPICS, Event, EventBus
+
+
+@pytest.fixture
+def bus():
+    return EventBus()
+
+
+def publish(bus, topic, key=None):
+    asyncio.run(bus.publish(topic, key))
+
+
+def test_set_and_get(bus):
+    c = InvalidatingCache(bus)
+    c.set("likes", "p1", 3, c.generation())
+
+    assert c.get("likes", "p1") == 3
+    assert c.get("likes", "p2") is None
+
+
+def test_key_event_drops_only_that_key(bus):
+    c = InvalidatingCache(bus)
+    c.set("likes", "p1", 3, c.generation())
+    c.set("likes", "p2", 4, c.generation())
+
+    publish(bus, "likes", "p1")
+
+    assert c.get("likes", "p1") is None
+    assert c.get("likes", "p2") == 4
+
+
+def test_topic_event_drops_whole_topic(bus):
+    c = InvalidatingCache(bus)
+    c.set("likes", "p1", 3, c.generation())
+    c.set("comments", "p1", [], c.generation())
+
+    publish(bus, "likes")
+
+    assert c.get("likes", "p1") is None
+    assert c.get("comments", "p1") == []
+
+
+def test_all_topics_clears_everything(bus):
+    c = InvalidatingCache(bus)
+    c.set("likes", "p1", 3, c.generation())
+    generation = c.generation()
+
+    c.invalidate(Event(topic=ALL_TOPICS))
+    c.set("comments", "p1", [], generation)
+
+    assert c.get("likes", "p1") is None
+    assert c.get("comments", "p1") is None
+
+
+def test_set_skipped_after_invalidation_during_read(bus):
+    c = InvalidatingCache(bus)
+
+    generation = c.generation()
+    publish(bus, "likes", "p1")  # write lands while the read is running
+    c.set("likes", "p1", 3, generation)
+
+    assert c.get("likes", "p1") is None
+
+    c.set("likes", "p1", 4, c.generation())
+    assert c.get("likes", "p1") == 4
+
+
+def test_unrelated_invalidation_does_not_block_set(bus):
+    c = InvalidatingCache(bus)
+
+    generation = c.generation()
+    publish(bus, "likes", "p2")
+    c.set("likes", "p1", 3, generation)
+
+    assert c.get("likes", "p1") == 3
+
+
+def test_topic_invalidation_during_read_blocks_set(bus):
+    c = InvalidatingCache(bus)
+
+    generation = c.generation()
+    publish(bus, "comments")
+    c.set("comments", "p1", [], generation)
+
+    assert c.get("comments", "p1") is None
+
+
+def test_stamp_overflow_treats_reads_as_stale(bus):
+    c = InvalidatingCache(bus)
+    c.max_stamps = 2
+
+    generation = c.generation()
+    for key in ("a", "b", "c"):
+        publish(bus, "likes", key)
+    c.set("likes", "z", 1, generation)
+
+    assert len(c._stamps) <= 2
+    assert c.get("likes", "z") is None
+
+
+def test_entries_expire(bus, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = InvalidatingCache(bus, ttl=5)
+    c.set("likes", "p1", 3, c.generation())
+
+    now[0] += 6
+
+    assert c.get("likes", "p1") is None
+
+
+def test_disabled_cache_stores_nothing(bus):
+    c = InvalidatingCache(bus, enabled=False)
+    c.set("likes", "p1", 3, c.generation())
+
+    assert c.get("likes", "p1") is None
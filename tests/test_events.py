@@ -0,0 +1,83 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from events import ALL_TOPICS, Event, EventBus, UnixSocketBus
+
+
+class FakeSession:
+    def __init__(self):
+        self.committed = False
+
+    async def commit(self):
+        self.committed = True
+
+
+def test_commit_dispatches_after_commit():
+    bus = EventBus()
+    session = FakeSession()
+    seen = []
+    bus.subscribe(lambda event: seen.append((session.committed, event)))
+
+    asyncio.run(bus.commit(session, ("posts", None), ("likes", 1)))
+
+    assert seen == [(True, Event("posts")), (True, Event("likes", "1"))]
+
+
+def test_unix_bus_delivers_to_other_workers():
+    # AF_UNIX paths are short, stay out of pytest's deep tmp_path
+    directory = os.path.join(tempfile.mkdtemp(), "bus")
+
+    async def scenario():
+        sender, receiver = UnixSocketBus(directory), UnixSocketBus(directory)
+        await sender.start()
+        await receiver.start()
+
+        seen = []
+        receiver.subscribe(seen.append)
+        await sender.publish_many([("likes", "p1"), ("comments", None)])
+        await asyncio.sleep(0.05)
+
+        await sender.stop()
+        await receiver.stop()
+        return seen
+
+    try:
+        seen = asyncio.run(scenario())
+    finally:
+        shutil.rmtree(os.path.dirname(directory))
+
+    assert seen == [Event("likes", "p1"), Event("comments")]
+
+
+def test_unix_bus_sequence_gap_invalidates_everything():
+    bus = UnixSocketBus("/unused")
+    seen = []
+    bus.subscribe(seen.append)
+
+    bus._receive({"source": "w1", "seq": 1, "events": [["likes", "a"]]})
+    bus._receive({"source": "w1", "seq": 3, "events": [["likes", "b"]]})
+
+    assert seen == [Event("likes", "a"), Event(ALL_TOPICS), Event("likes", "b")]
+
+
+def test_unix_bus_first_datagram_from_sender_is_not_a_gap():
+    bus = UnixSocketBus("/unused")
+    seen = []
+    bus.subscribe(seen.append)
+
+    bus._receive({"source": "w1", "seq": 7, "events": [["likes", "a"]]})
+
+    assert seen == [Event("likes", "a")]
+
+
+def test_unix_bus_refuses_shared_directory(tmp_path):
+    directory = tmp_path / "bus"
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(UnixSocketBus(str(directory)).start())
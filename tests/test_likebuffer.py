@@ -0,0 +1,230 @@
+import asyncio
+import uuid
+
+import pytest
+
+import likebuffer
+from events import EventBus
+from likebuffer import LikeBuffer
+
+USER = uuid.uuid4()
+POST = uuid.uuid4()
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+
+class FakeSession:
+    """Answers the like lookup in toggle() and records commits."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, statement):
+        if not self.db.post_exists:
+            return FakeResult(None)
+        return FakeResult((POST, uuid.uuid4() if self.db.liked else None))
+
+    async def commit(self):
+        self.db.commits += 1
+
+
+class FakeDB:
+    def __init__(self, liked=False, post_exists=True):
+        self.liked = liked
+        self.post_exists = post_exists
+        self.commits = 0
+        self.batches = []
+        self.fail = False
+        self.block: asyncio.Event = None
+
+    def session(self):
+        return FakeSession(self)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(likebuffer, "async_session_maker", db.session)
+
+    async def write(buffer, session):
+        if db.block is not None:
+            await db.block.wait()
+        if db.fail:
+            raise RuntimeError("database down")
+        db.batches.append(dict(buffer._inflight))
+
+    monkeypatch.setattr(LikeBuffer, "_write", write)
+    return db
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_toggle_buffers_and_cancels_out(db):
+    async def scenario():
+        buffer = LikeBuffer(EventBus())
+
+        assert await buffer.toggle(USER, POST, db.session()) is True
+        assert buffer.liked(USER, POST) is True
+        assert buffer.delta(POST) == 1
+
+        assert await buffer.toggle(USER, POST, db.session()) is False
+        assert buffer.liked(USER, POST) is None
+        assert buffer.delta(POST) == 0
+        assert buffer._pending == {}
+
+        await buffer.flush()
+        assert db.commits == 0
+
+    run(scenario())
+
+
+def test_toggle_unknown_post(db):
+    db.post_exists = False
+
+    async def scenario():
+        buffer = LikeBuffer(EventBus())
+        assert await buffer.toggle(USER, POST, db.session()) is None
+        assert buffer._pending == {}
+
+    run(scenario())
+
+
+def test_flush_writes_batch_and_settles_delta(db):
+    async def scenario():
+        bus = EventBus()
+        buffer = LikeBuffer(bus)
+        # delta must already be settled when local caches hear about it
+        seen = []
+        bus.subscribe(lambda event: seen.append((event.key, buffer.delta(POST))))
+
+        await buffer.toggle(USER, POST, db.session())
+        await buffer.flush()
+
+        assert db.batches == [{(USER, POST): (False, True)}]
+        assert buffer._pending == {} and buffer._inflight == {}
+        assert buffer.delta(POST) == 0
+        assert seen == [(str(POST), 0)]
+
+    run(scenario())
+
+
+def test_toggle_during_flush_is_rebased_on_inflight(db):
+    async def scenario():
+        buffer = LikeBuffer(EventBus())
+        await buffer.toggle(USER, POST, db.session())
+
+        db.block = asyncio.Event()
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        assert buffer._inflight == {(USER, POST): (False, True)}
+
+        # unlike while the like is being written
+        assert await buffer.toggle(USER, POST, db.session()) is False
+        assert buffer._pending == {(USER, POST): (True, False)}
+
+        db.block.set()
+        await flush
+
+        # stored like count is one higher now, the pending unlike offsets it
+        assert buffer.delta(POST) == -1
+        assert buffer.liked(USER, POST) is False
+
+    run(scenario())
+
+
+def test_failed_flush_requeues(db):
+    db.fail = True
+
+    async def scenario():
+        buffer = LikeBuffer(EventBus())
+        await buffer.toggle(USER, POST, db.session())
+        await buffer.flush()
+
+        assert db.commits == 0
+        assert buffer._pending == {(USER, POST): (False, True)}
+        assert buffer._inflight == {}
+        assert buffer.delta(POST) == 1
+
+        db.fail = False
+        await buffer.flush()
+        assert db.commits == 1
+        assert buffer.delta(POST) == 0
+
+    run(scenario())
+
+
+def test_failed_flush_with_toggle_back_cancels_out(db):
+    async def scenario():
+        buffer = LikeBuffer(EventBus())
+        await buffer.toggle(USER, POST, db.session())
+
+        db.fail = True
+        db.block = asyncio.Event()
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        await buffer.toggle(USER, POST, db.session())
+        db.block.set()
+        await flush
+
+        assert buffer._pending == {}
+        assert buffer.delta(POST) == 0
+
+    run(scenario())
+
+
+def test_stop_waits_for_running_flush(db):
+    async def scenario():
+        buffer = LikeBuffer(EventBus(), interval=0.01)
+        await buffer.start()
+        await buffer.toggle(USER, POST, db.session())
+
+        db.block = asyncio.Event()
+        await asyncio.sleep(0.05)  # flusher is now stuck in _write
+        assert buffer._inflight
+
+        stop = asyncio.create_task(buffer.stop())
+        await asyncio.sleep(0)
+        db.block.set()
+        await stop
+
+        assert db.commits == 1
+        assert buffer._pending == {} and buffer._inflight == {}
+
+    run(scenario())
+
+
+def test_flusher_survives_subscriber_errors(db):
+    async def scenario():
+        bus = EventBus()
+
+        def broken(event):
+            raise RuntimeError("subscriber bug")
+
+        bus.subscribe(broken)
+        buffer = LikeBuffer(bus, interval=0.01)
+        await buffer.start()
+
+        await buffer.toggle(USER, POST, db.session())
+        await asyncio.sleep(0.05)
+        await buffer.toggle(USER, uuid.uuid4(), db.session())
+        await asyncio.sleep(0.05)
+
+        assert not buffer._task.done()
+        await buffer.stop()
+        assert db.commits == 2
+
+    run(scenario())
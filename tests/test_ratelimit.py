@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import ratelimit
+from ratelimit import ConcurrencyLimiter, InMemoryBucketStore, too_many_requests
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def take(store, key, rate=1.0, burst=3):
+    return asyncio.run(store.take(key, rate, burst))
+
+
+def test_burst_then_refused(clock):
+    store = InMemoryBucketStore()
+
+    assert [take(store, "a") for _ in range(3)] == [0, 0, 0]
+    assert take(store, "a") == pytest.approx(1.0)
+
+
+def test_refill_over_time(clock):
+    store = InMemoryBucketStore()
+    for _ in range(3):
+        take(store, "a", rate=2)
+
+    clock.now += 0.25
+    assert take(store, "a", rate=2) == pytest.approx(0.25)
+
+    clock.now += 0.25
+    assert take(store, "a", rate=2) == 0
+
+
+def test_keys_are_independent(clock):
+    store = InMemoryBucketStore()
+    for _ in range(3):
+        take(store, "a")
+
+    assert take(store, "b") == 0
+
+
+def test_retry_after_header_rounds_up():
+    assert too_many_requests(0.2).headers["Retry-After"] == "1"
+    assert too_many_requests(2.1).headers["Retry-After"] == "3"
+    assert too_many_requests(2.1).status_code == 429
+
+
+def test_idle_buckets_swept_on_interval(clock):
+    store = InMemoryBucketStore(sweep_interval=10)
+    take(store, "a")
+
+    clock.now += 10
+    take(store, "b")
+
+    assert "a" not in store._buckets
+    assert len(store) == 1
+
+
+def test_cap_evicts_idle_buckets_before_drained_ones(clock):
+    store = InMemoryBucketStore(max_buckets=10, sweep_interval=1000)
+    # drained, then idle long enough to be full again
+    for i in range(5):
+        take(store, f"idle{i}", burst=1)
+    clock.now += 5
+    for i in range(5):
+        take(store, f"busy{i}", burst=1)
+
+    take(store, "new", burst=1)
+
+    assert all(f"busy{i}" in store._buckets for i in range(5))
+    assert not any(f"idle{i}" in store._buckets for i in range(5))
+    # the busy buckets kept their state
+    assert take(store, "busy0", burst=1) > 0
+
+
+def test_cap_falls_back_to_lru(clock):
+    store = InMemoryBucketStore(max_buckets=10, sweep_interval=1000)
+    for i in range(10):
+        take(store, f"k{i}")
+    take(store, "k0")
+
+    take(store, "new")
+
+    assert len(store) <= 10
+    assert "k0" in store._buckets
+    assert "k1" not in store._buckets
+
+
+def test_concurrency_limiter_rejects_over_limit():
+    limiter = ConcurrencyLimiter(limit=1)
+
+    async def scenario():
+        first = limiter()
+        await first.__anext__()
+
+        with pytest.raises(HTTPException) as exc:
+            await limiter().__anext__()
+        assert exc.value.status_code == 429
+
+        await first.aclose()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
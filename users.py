@@ -9,6 +9,7 @@ from fastapi_users.authentication import (
 )
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from db import User, get_user_db
+from events import get_event_bus
 
 SECRET="enter secret key"
 
@@ -22,6 +23,11 @@ class UserManager(UUIDIDMixin, BaseUserManager[User,uuid.UUID]):
     async def on_after_forgot_password(self, user:User,token:str, request:Optional[Request] = None):
         print(f'User {user.id} has forgot their password. Reset token {token}')
     
+    async def on_after_update(self, user:User, update_dict:dict, request:Optional[Request] = None):
+        # cached comments carry the author's username
+        if "username" in update_dict:
+            await get_event_bus().publish("comments")
+
     async def on_after_request_verify(self, user:User, token:str, request:Optional[Request] = None):
         print(f"verification requested for user {user.id}.Verification token:{token}")
 